@@ -1,101 +1,25 @@
 """行動ログを整形して出力する."""
 import logging
-import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from logging import Formatter, StreamHandler
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from typing import Self
 
-import requests
-from pydantic import BaseModel
+from toggl_client import Project, TimeEntry, ToggleService
 
 _logger = logging.getLogger(__name__)
 
-# consoleに標準出力するためのLogger
-logger_console = logging.getLogger("toggl_tools_py_console")
-logger_console.handlers.clear()
-logger_console.setLevel(logging.INFO)
-logger_console.addHandler(logging.StreamHandler(stream=sys.stdout))
+# 表示に利用するタイムゾーン. 日本標準時とする.
+_JST = timezone(timedelta(hours=9))
 
 
-class _TimeEntry(BaseModel):
-    """togglの時間記録データを表す."""
-
-    name: str
-
-    start: str
-    stop: str
-
-    project_id: int
-
-
-class _Project(BaseModel):
-    """togglのプロジェクトデータを表す."""
-
-    project_id: int
-
-    name: str
-
-
-class _ToggleService:
-    """Togglサービスへ接続しデータを取得する."""
-
-    _API_BASE_URL = "https://api.track.toggl.com/api/v9"
-
-    def __init__(self: Self, api_key: str | None = None) -> None:
-        if api_key is None:
-            self._api_key = os.environ.get("TOGGL_API_KEY", "")
-        else:
-            self._api_key = api_key
-
-    def get_time_entries(
-        self: Self, start_date: datetime, end_date: datetime
-    ) -> list[_TimeEntry]:
-        """Entryを取得する."""
-        params = {
-            # 時間記述は下記のような形式になることを想定している
-            # - "start_date": "2023-09-12T00:00:00.0000+09:00",
-            "start_date": start_date.isoformat(timespec="milliseconds"),
-            "end_date": end_date.isoformat(timespec="milliseconds"),
-        }
-        response = requests.get(
-            f"{self._API_BASE_URL}/me/time_entries",
-            auth=(self._api_key, "api_token"),
-            params=params,
-            timeout=10,
-        )
-
-        entries: list[_TimeEntry] = []
-        for entry in response.json():
-            time_entry = _TimeEntry(
-                name=entry["description"],
-                start=entry["start"],
-                stop=entry["stop"],
-                project_id=entry["project_id"],
-            )
-            entries.append(time_entry)
-
-        return entries
-
-    def get_projects(self: Self) -> list[_Project]:
-        """Project一覧を取得する."""
-        response = requests.get(
-            f"{self._API_BASE_URL}/me/projects",
-            auth=(self._api_key, "api_token"),
-            timeout=10,
-        )
-
-        projects = []
-        for project in response.json():
-            data = _Project(
-                project_id=project["id"],
-                name=project["name"],
-            )
-            projects.append(data)
-
-        return projects
+def _to_jst_time_str(value: datetime) -> str:
+    """タイムゾーン付きの時刻をJSTのHH:MM形式の文字列にする."""
+    dt_tz = value.astimezone(_JST)
+    return f"{dt_tz.hour:02d}:{dt_tz.minute:02d}"
 
 
 class _MarkdownListPrinter:
@@ -105,37 +29,41 @@ class _MarkdownListPrinter:
         pass
 
     def display(
-        self: Self, time_entries: list[_TimeEntry], projects: list[_Project]
+        self: Self, time_entries: list[TimeEntry], projects: list[Project]
     ) -> None:
         project_dict = {p.project_id: p for p in projects}
 
+        # 行ごとに出力せず、まとめて一度に標準出力へ書き込む
+        lines: list[str] = []
         for entry in time_entries:
             project_name = project_dict[entry.project_id].name
-            dt_tz = datetime.fromisoformat(entry.start).astimezone(
-                timezone(timedelta(hours=9))
-            )
-            time_str = dt_tz.strftime("%H:%M")
-            logger_console.info("- %s %s %s", time_str, project_name, entry.name)
+            time_str = _to_jst_time_str(entry.start)
+            lines.append(f"- {time_str} {project_name} {entry.name}")
         last_entry = time_entries[-1]
-        dt_tz = datetime.fromisoformat(
-            last_entry.stop.replace("Z", "+00:00")
-        ).astimezone(timezone(timedelta(hours=9)))
-        time_str = dt_tz.strftime("%H:%m")
-        logger_console.info("- %s 終了", time_str)
+        time_str = _to_jst_time_str(last_entry.stop)
+        lines.append(f"- {time_str} 終了")
+
+        sys.stdout.write("\n".join(lines) + "\n")
 
 
 def _main() -> None:
     """スクリプトのエントリポイント."""
     _setup_logger(filepath=None, loglevel=logging.INFO)
 
-    toggl_service = _ToggleService(api_key=None)
-    time_entries = toggl_service.get_time_entries(
-        datetime.fromisoformat("2023-10-10T00:00:00+09:00"),
-        datetime.fromisoformat("2023-10-11T00:00:00+09:00"),
-    )
-    time_entries = sorted(time_entries, key=lambda x: x.start)
+    with (
+        ToggleService(api_key=None) as toggl_service,
+        ThreadPoolExecutor(max_workers=ToggleService.MAX_CONNECTIONS) as executor,
+    ):
+        # 互いに独立したAPI呼び出しのため並列に実行する
+        time_entries_future = executor.submit(
+            toggl_service.get_time_entries,
+            datetime.fromisoformat("2023-10-10T00:00:00+09:00"),
+            datetime.fromisoformat("2023-10-11T00:00:00+09:00"),
+        )
+        project_list_future = executor.submit(toggl_service.get_projects)
 
-    project_list = toggl_service.get_projects()
+        time_entries = sorted(time_entries_future.result(), key=lambda x: x.start)
+        project_list = project_list_future.result()
 
     printer = _MarkdownListPrinter()
     printer.display(time_entries=time_entries, projects=project_list)
@@ -149,29 +77,39 @@ def _setup_logger(
     # ファイル出力とコンソール出力を行うように設定する。
     _logger.setLevel(loglevel)
 
+    # 複数回呼び出された場合は、名前で既存のハンドラを探してレベルのみ更新し、
+    # ハンドラが重複しないようにする
+    handlers = {handler.get_name(): handler for handler in _logger.handlers}
+
     # consoleログ
-    console_handler = StreamHandler(stream=sys.stderr)
+    console_handler = handlers.get("console")
+    if console_handler is None:
+        console_handler = StreamHandler(stream=sys.stderr)
+        console_handler.set_name("console")
+        console_handler.setFormatter(
+            Formatter("[%(levelname)7s] %(asctime)s (%(name)s) %(message)s")
+        )
+        _logger.addHandler(console_handler)
     console_handler.setLevel(loglevel)
-    console_handler.setFormatter(
-        Formatter("[%(levelname)7s] %(asctime)s (%(name)s) %(message)s")
-    )
-    _logger.addHandler(console_handler)
 
     # ファイル出力するログ
     # 基本的に大量に利用することを想定していないので、ログファイルは多くは残さない。
     if filepath is not None:
-        file_handler = RotatingFileHandler(
-            filepath,
-            encoding="utf-8",
-            mode="a",
-            maxBytes=10 * 1024 * 1024,  # 10 MB
-            backupCount=1,
-        )
+        file_handler = handlers.get(f"file:{filepath}")
+        if file_handler is None:
+            file_handler = RotatingFileHandler(
+                filepath,
+                encoding="utf-8",
+                mode="a",
+                maxBytes=10 * 1024 * 1024,  # 10 MB
+                backupCount=1,
+            )
+            file_handler.set_name(f"file:{filepath}")
+            file_handler.setFormatter(
+                Formatter("[%(levelname)7s] %(asctime)s (%(name)s) %(message)s")
+            )
+            _logger.addHandler(file_handler)
         file_handler.setLevel(loglevel)
-        file_handler.setFormatter(
-            Formatter("[%(levelname)7s] %(asctime)s (%(name)s) %(message)s")
-        )
-        _logger.addHandler(file_handler)
 
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@
 import logging
 import os
 import sys
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from logging import Formatter, StreamHandler
@@ -10,119 +10,13 @@ from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from typing import ClassVar, Self
 
-import requests
-from pydantic import BaseModel
+from toggl_client import Project, Tag, TimeEntry, ToggleService
 
 _logger = logging.getLogger(__name__)
 
-# consoleに標準出力するためのLogger
-logger_console = logging.getLogger("toggl_tools_py_console")
-logger_console.handlers.clear()
-logger_console.setLevel(logging.INFO)
-logger_console.addHandler(logging.StreamHandler(stream=sys.stdout))
-
-
-class _TimeEntry(BaseModel):
-    name: str
-
-    start: str
-    stop: str
-    duration: int
-
-    project_id: int
-    tag_ids: list[int]
-
-
-class _Project(BaseModel):
-    project_id: int
-
-    name: str
-
-
-class _Tag(BaseModel):
-    tag_id: int
-
-    name: str
-
-
-class _ToggleService:
-    """Togglサービスへ接続しデータを取得する."""
-
-    _API_BASE_URL = "https://api.track.toggl.com/api/v9"
-
-    def __init__(self: Self, api_key: str | None = None) -> None:
-        if api_key is None:
-            self._api_key = os.environ.get("TOGGL_API_KEY", "")
-        else:
-            self._api_key = api_key
-
-    def get_time_entries(
-        self: Self, start_date: datetime, end_date: datetime
-    ) -> list[_TimeEntry]:
-        """Entryを取得する."""
-        params = {
-            # 時間表記としては下記のような形式になることを想定している
-            # - "start_date": "2023-09-12T00:00:00.0000+09:00",
-            "start_date": start_date.isoformat(timespec="milliseconds"),
-            "end_date": end_date.isoformat(timespec="milliseconds"),
-        }
-        response = requests.get(
-            f"{self._API_BASE_URL}/me/time_entries",
-            auth=(self._api_key, "api_token"),
-            params=params,
-            timeout=10,
-        )
-        _logger.info(response)
-
-        entries: list[_TimeEntry] = []
-        for entry in response.json():
-            time_entry = _TimeEntry(
-                name=entry["description"],
-                start=entry["start"],
-                stop=entry["stop"],
-                duration=entry["duration"],
-                project_id=entry["project_id"],
-                tag_ids=entry["tag_ids"],
-            )
-            entries.append(time_entry)
-
-        return entries
-
-    def get_projects(self: Self) -> list[_Project]:
-        """Project一覧を取得する."""
-        response = requests.get(
-            f"{self._API_BASE_URL}/me/projects",
-            auth=(self._api_key, "api_token"),
-            timeout=10,
-        )
-
-        projects = []
-        for project in response.json():
-            data = _Project(
-                project_id=project["id"],
-                name=project["name"],
-            )
-            projects.append(data)
-
-        return projects
-
-    def get_tags(self: Self) -> list[_Tag]:
-        """タグ一覧を取得する."""
-        response = requests.get(
-            f"{self._API_BASE_URL}/me/tags",
-            auth=(self._api_key, "api_token"),
-            timeout=10,
-        )
-
-        tags: list[_Tag] = []
-        for entry in response.json():
-            tag = _Tag(
-                tag_id=entry["id"],
-                name=entry["name"],
-            )
-            tags.append(tag)
-
-        return tags
+# APIを並列に呼び出すときの同時リクエスト数の上限.
+# Togglはトークンごとにレート制限があるため、接続プールの大きさとは別に小さく抑える.
+_MAX_CONCURRENT_REQUESTS = 3
 
 
 @dataclass
@@ -134,91 +28,116 @@ class _TagDuration:
 
 
 class _Durations:
-    EXCLUDE_TAG_IDS: ClassVar = [
+    EXCLUDE_TAG_IDS: ClassVar[frozenset[int]] = frozenset(
         int(v)
         for v in os.environ.get("TOGGL_EXCLUDE_TAG_IDS", "").split(",")
         if v != ""
-    ]
+    )
 
     def __init__(self: Self) -> None:
         pass
 
     def calc_tag_durations(
-        self: Self, time_entries: list[_TimeEntry]
+        self: Self, time_entries: list[TimeEntry]
     ) -> list[_TagDuration]:
         """プロジェクトごと、かつタグごとの総和時間を返す."""
-        durations: dict[int, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        # (project_id, tag_id) をキーとして集計する
+        durations: dict[tuple[int, int], int] = {}
         for entry in time_entries:
+            project_id = entry.project_id
+            duration = entry.duration
             for tag_id in entry.tag_ids:
                 if tag_id in self.EXCLUDE_TAG_IDS:
                     continue
 
-                durations[entry.project_id][tag_id] += entry.duration
+                key = (project_id, tag_id)
+                durations[key] = durations.get(key, 0) + duration
 
         return [
             _TagDuration(project_id=project_id, tag_id=tag_id, duration=duration)
-            for project_id, entry in durations.items()
-            for tag_id, duration in entry.items()
+            for (project_id, tag_id), duration in durations.items()
         ]
 
 
+def _quarter_hours(seconds: int) -> float:
+    """秒数を0.25時間刻みに丸めた時間に変換する."""
+    # 浮動小数点の丸め誤差を避けるため、最後の除算まで整数で計算する
+    return ((seconds * 4 + 1800) // 3600) / 4
+
+
 class _MarkdownTablePrinter:
+    _HEADER_LINES: ClassVar = (
+        "| Project | Tag | Duration |",
+        "| :------ | :-- | -------: |",
+    )
+
     def __init__(self: Self) -> None:
         pass
 
     def display(
         self: Self,
         durations: list[_TagDuration],
-        projects: list[_Project],
-        tags: list[_Tag],
+        projects: list[Project],
+        tags: list[Tag],
     ) -> None:
-        project_names = {v.project_id: v.name for v in projects}
-        tag_names = {v.tag_id: v.name for v in tags}
-
-        # プロジェクトとタグで分離するためにdictを利用する
-        duration_hash: dict[int, dict[int, _TagDuration]] = defaultdict(
-            lambda: defaultdict(
-                lambda: _TagDuration(project_id=0, tag_id=0, duration=0)
-            )
-        )
-        for duration in durations:
-            duration_hash[duration.project_id][duration.tag_id] = duration
-
-        # プロジェクトごとの経過時間を算出
-        project_durations: dict[int, int] = defaultdict(int)
+        # 同じ名前が多くの行で参照されるため、文字列を共有する
+        project_names = {v.project_id: sys.intern(v.name) for v in projects}
+        tag_names = {v.tag_id: sys.intern(v.name) for v in tags}
+
+        # プロジェクトとタグで分離するためにdictを利用し、
+        # 同時にプロジェクトごとの経過時間を算出する
+        duration_hash: dict[int, dict[int, _TagDuration]] = {}
+        project_durations: dict[int, int] = {}
         for duration in durations:
-            project_durations[duration.project_id] += duration.duration
+            project_id = duration.project_id
+            duration_hash.setdefault(project_id, {})[duration.tag_id] = duration
+            project_durations[project_id] = (
+                project_durations.get(project_id, 0) + duration.duration
+            )
 
-        logger_console.info("| Project | Tag | Duration |")
-        logger_console.info("| :------ | :-- | -------: |")
+        # 行ごとに出力せず、まとめて一度に標準出力へ書き込む
+        lines = list(self._HEADER_LINES)
         for project_id in duration_hash:
             project_name = project_names[project_id]
-            project_duration = (
-                round(project_durations[project_id] / 3600 * 4) / 4
-            )  # 0.25刻みに修正
-            logger_console.info("| %s | - | %.2f |", project_name, project_duration)
+            project_duration = _quarter_hours(project_durations[project_id])
+            lines.append(f"| {project_name} | - | {project_duration:.2f} |")
 
             for tag_id, duration in duration_hash[project_id].items():
                 tag_name = tag_names[tag_id]
-                time_value = round(duration.duration / 3600 * 4) / 4  # 0.25刻みに修正
-                logger_console.info(
-                    "| %s | %s | %.2f |", project_name, tag_name, time_value
-                )
+                time_value = _quarter_hours(duration.duration)
+                lines.append(f"| {project_name} | {tag_name} | {time_value:.2f} |")
+
+        sys.stdout.write("\n".join(lines) + "\n")
 
 
 def _main() -> None:
     """スクリプトのエントリポイント."""
     _setup_logger(filepath=None, loglevel=logging.INFO)
 
-    toggl_service = _ToggleService(api_key=None)
     start_date = datetime.fromisoformat("2023-10-10T00:00:00+09:00")
-    for index in range(2):
-        current_date = start_date + timedelta(days=index)
-        end_date = current_date + timedelta(days=1)
-        time_entries = toggl_service.get_time_entries(current_date, end_date)
-        time_entries = sorted(time_entries, key=lambda x: x.start)
-        project_list = toggl_service.get_projects()
-        tags_list = toggl_service.get_tags()
+    target_dates = [start_date + timedelta(days=index) for index in range(2)]
+    with (
+        ToggleService(api_key=None) as toggl_service,
+        ThreadPoolExecutor(max_workers=_MAX_CONCURRENT_REQUESTS) as executor,
+    ):
+        # 日ごとの記録とプロジェクト・タグ一覧は互いに独立しているため並列に取得する
+        time_entries_futures = [
+            executor.submit(
+                toggl_service.get_time_entries,
+                current_date,
+                current_date + timedelta(days=1),
+            )
+            for current_date in target_dates
+        ]
+        project_list_future = executor.submit(toggl_service.get_projects)
+        tags_list_future = executor.submit(toggl_service.get_tags)
+
+        time_entries_list = [future.result() for future in time_entries_futures]
+        project_list = project_list_future.result()
+        tags_list = tags_list_future.result()
+
+    for current_date, entries in zip(target_dates, time_entries_list, strict=True):
+        time_entries = sorted(entries, key=lambda x: x.start)
 
         durations = _Durations()
         tag_durations = durations.calc_tag_durations(time_entries=time_entries)
@@ -236,29 +155,39 @@ def _setup_logger(
     # ファイル出力とコンソール出力を行うように設定する。
     _logger.setLevel(loglevel)
 
+    # 複数回呼び出された場合は、名前で既存のハンドラを探してレベルのみ更新し、
+    # ハンドラが重複しないようにする
+    handlers = {handler.get_name(): handler for handler in _logger.handlers}
+
     # consoleログ
-    console_handler = StreamHandler(stream=sys.stderr)
+    console_handler = handlers.get("console")
+    if console_handler is None:
+        console_handler = StreamHandler(stream=sys.stderr)
+        console_handler.set_name("console")
+        console_handler.setFormatter(
+            Formatter("[%(levelname)7s] %(asctime)s (%(name)s) %(message)s")
+        )
+        _logger.addHandler(console_handler)
     console_handler.setLevel(loglevel)
-    console_handler.setFormatter(
-        Formatter("[%(levelname)7s] %(asctime)s (%(name)s) %(message)s")
-    )
-    _logger.addHandler(console_handler)
 
     # ファイル出力するログ
     # 基本的に大量に利用することを想定していないので、ログファイルは多くは残さない。
     if filepath is not None:
-        file_handler = RotatingFileHandler(
-            filepath,
-            encoding="utf-8",
-            mode="a",
-            maxBytes=10 * 1024 * 1024,  # 10 MB
-            backupCount=1,
-        )
+        file_handler = handlers.get(f"file:{filepath}")
+        if file_handler is None:
+            file_handler = RotatingFileHandler(
+                filepath,
+                encoding="utf-8",
+                mode="a",
+                maxBytes=10 * 1024 * 1024,  # 10 MB
+                backupCount=1,
+            )
+            file_handler.set_name(f"file:{filepath}")
+            file_handler.setFormatter(
+                Formatter("[%(levelname)7s] %(asctime)s (%(name)s) %(message)s")
+            )
+            _logger.addHandler(file_handler)
         file_handler.setLevel(loglevel)
-        file_handler.setFormatter(
-            Formatter("[%(levelname)7s] %(asctime)s (%(name)s) %(message)s")
-        )
-        _logger.addHandler(file_handler)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+"""Togglサービスへ接続するクライアント."""
+import logging
+import os
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime
+from operator import itemgetter
+from types import TracebackType
+from typing import Any, ClassVar, Self
+
+import ijson
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_logger = logging.getLogger(__name__)
+
+# 圧縮されておらず、Content-Lengthがこの大きさ未満のレスポンスは一括で読み込む.
+# 圧縮されている場合はContent-Lengthが展開後の大きさを表さないため常に逐次パースする.
+_STREAM_THRESHOLD_BYTES = 1024 * 1024
+
+# 時間記録のレスポンスのうち利用する項目. それ以外の項目は読み捨てる.
+_TIME_ENTRY_FIELDS = itemgetter(
+    "description", "start", "stop", "duration", "project_id", "tag_ids"
+)
+
+
+@dataclass(slots=True, frozen=True)
+class TimeEntry:
+    """togglの時間記録データを表す."""
+
+    name: str
+
+    start: datetime
+    stop: datetime
+    duration: int
+
+    project_id: int
+    tag_ids: tuple[int, ...]
+
+
+@dataclass(slots=True, frozen=True)
+class Project:
+    """togglのプロジェクトデータを表す."""
+
+    project_id: int
+
+    name: str
+
+
+@dataclass(slots=True, frozen=True)
+class Tag:
+    """togglのタグデータを表す."""
+
+    tag_id: int
+
+    name: str
+
+
+def _iter_json_array(response: requests.Response) -> Iterator[dict[str, Any]]:
+    """JSON配列のレスポンスを要素ごとに返す.
+
+    長期間の記録など大きなレスポンスは、全体をメモリに展開せず逐次的にパースする。
+    """
+    content_length = response.headers.get("Content-Length")
+    content_encoding = response.headers.get("Content-Encoding", "identity")
+    if (
+        content_encoding == "identity"
+        and content_length is not None
+        and int(content_length) < _STREAM_THRESHOLD_BYTES
+    ):
+        # 取り出した要素から順に解放されるよう、リストから取り除きながら返す
+        records = orjson.loads(response.content)
+        records.reverse()
+        while records:
+            yield records.pop()
+        return
+
+    response.raw.decode_content = True  # gzipなどの圧縮を展開して読み込む
+    yield from ijson.items(response.raw, "item")
+
+
+class ToggleService:
+    """Togglサービスへ接続しデータを取得する."""
+
+    _API_BASE_URL = "https://api.track.toggl.com/api/v9"
+
+    # 接続プールで同時に保持する接続数の上限.
+    MAX_CONNECTIONS: ClassVar = 8
+
+    def __init__(self: Self, api_key: str | None = None) -> None:
+        """APIキーを設定し、接続に利用するSessionを作成する.
+
+        api_keyがNoneの場合は環境変数TOGGL_API_KEYを利用する。
+        """
+        if api_key is None:
+            self._api_key = os.environ.get("TOGGL_API_KEY", "")
+        else:
+            self._api_key = api_key
+
+        # 複数のAPI呼び出しでTLS接続を再利用するためにSessionを共有する
+        self._session = requests.Session()
+        self._session.auth = (self._api_key, "api_token")
+        # 一時的なエラーやレート制限(429)では、Retry-Afterに従って再試行する
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+        )
+        self._session.mount(
+            "https://",
+            HTTPAdapter(
+                max_retries=retry,
+                pool_connections=4,
+                pool_maxsize=self.MAX_CONNECTIONS,
+            ),
+        )
+
+        # プロジェクトやタグは取得期間に依存しないため一度取得したら再利用する
+        self._projects_cache: list[Project] | None = None
+        self._tags_cache: list[Tag] | None = None
+
+    def __enter__(self: Self) -> Self:
+        """withブロックで利用できるように自身を返す."""
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """withブロックを抜けるときに接続を解放する."""
+        self.close()
+
+    def close(self: Self) -> None:
+        """接続を解放する."""
+        self._session.close()
+
+    def invalidate(self: Self) -> None:
+        """キャッシュしている一覧を破棄し、次回の呼び出しで再取得する."""
+        self._projects_cache = None
+        self._tags_cache = None
+
+    def get_time_entries(
+        self: Self, start_date: datetime, end_date: datetime
+    ) -> list[TimeEntry]:
+        """Entryを取得する."""
+        params = {
+            # 時間表記としては下記のような形式になることを想定している
+            # - "start_date": "2023-09-12T00:00:00.0000+09:00",
+            "start_date": start_date.isoformat(timespec="milliseconds"),
+            "end_date": end_date.isoformat(timespec="milliseconds"),
+        }
+        with self._session.get(
+            f"{self._API_BASE_URL}/me/time_entries",
+            params=params,
+            timeout=10,
+            stream=True,
+        ) as response:
+            _logger.debug(response)
+            # 逐次パースでは配列以外のエラー応答が空として扱われるため先に確認する
+            response.raise_for_status()
+
+            # 時刻は末尾が"Z"の場合とオフセット付きの場合があるが、
+            # python 3.11以降のfromisoformatはどちらも解釈できる
+            return [
+                TimeEntry(
+                    name=name,
+                    start=datetime.fromisoformat(start),
+                    stop=datetime.fromisoformat(stop),
+                    duration=duration,
+                    project_id=project_id,
+                    tag_ids=tuple(tag_ids),
+                )
+                for name, start, stop, duration, project_id, tag_ids in map(
+                    _TIME_ENTRY_FIELDS, _iter_json_array(response)
+                )
+            ]
+
+    def get_projects(self: Self) -> list[Project]:
+        """Project一覧を取得する."""
+        if self._projects_cache is not None:
+            return self._projects_cache
+
+        response = self._session.get(
+            f"{self._API_BASE_URL}/me/projects",
+            timeout=10,
+        )
+        response.raise_for_status()
+
+        projects = [
+            Project(
+                project_id=project["id"],
+                name=project["name"],
+            )
+            for project in orjson.loads(response.content)
+        ]
+        self._projects_cache = projects
+
+        return projects
+
+    def get_tags(self: Self) -> list[Tag]:
+        """タグ一覧を取得する."""
+        if self._tags_cache is not None:
+            return self._tags_cache
+
+        response = self._session.get(
+            f"{self._API_BASE_URL}/me/tags",
+            timeout=10,
+        )
+        response.raise_for_status()
+
+        tags = [
+            Tag(
+                tag_id=entry["id"],
+                name=entry["name"],
+            )
+            for entry in orjson.loads(response.content)
+        ]
+        self._tags_cache = tags
+
+        return tags